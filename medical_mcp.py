@@ -1,21 +1,31 @@
 import os
+import re
 import json
 import asyncio
-from typing import Any, Dict, List, Optional, Union
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 from dataclasses import dataclass
 import httpx
+import ijson
+import orjson
 from fastmcp import FastMCP
 from fastmcp.server.auth.providers.bearer import BearerAuthProvider, RSAKeyPair
 from mcp.server.auth.provider import AccessToken
+from cryptography.hazmat.primitives import serialization
 from mcp.types import TextContent, ImageContent, INVALID_PARAMS, INTERNAL_ERROR
 from pydantic import BaseModel, Field, AnyUrl
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+from lxml.cssselect import CSSSelector
 import random
 import time
 
 # --- Load environment variables ---
 TOKEN = os.environ.get("PUCH_AUTH_TOKEN")
 MY_NUMBER = os.environ.get("MY_NUMBER")
+RSA_KEY_PATH = os.environ.get("RSA_KEY_PATH")
+NCBI_API_KEY = os.environ.get("NCBI_API_KEY")
 
 assert TOKEN is not None, "Please set PUCH_AUTH_TOKEN in your .env file"
 assert MY_NUMBER is not None, "Please set MY_NUMBER in your .env file"
@@ -27,12 +37,95 @@ RXNAV_API_BASE = "https://rxnav.nlm.nih.gov/REST"
 PUBMED_API_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
 GOOGLE_SCHOLAR_API_BASE = "https://scholar.google.com/scholar"
 USER_AGENT = "medical-mcp/1.0"
+SCHOLAR_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache"
+}
+
+# --- Google Scholar Selectors ---
+# Compiled once at import; each field folds its old select_one() fallbacks
+# into one selector group and takes the first match in document order.
+SCHOLAR_RESULT_SEL = CSSSelector(".gs_r, .gs_ri, [data-rp]")
+SCHOLAR_TITLE_SEL = CSSSelector(".gs_rt a, .gs_rt, h3 a, h3, a[data-clk]")
+SCHOLAR_AUTHORS_SEL = CSSSelector('.gs_a, .gs_authors, .gs_venue, [class*="author"], [class*="venue"]')
+SCHOLAR_ABSTRACT_SEL = CSSSelector('.gs_rs, .gs_rs_a, .gs_snippet, [class*="snippet"], [class*="abstract"]')
+SCHOLAR_CITATIONS_SEL = CSSSelector('.gs_fl a, .gs_fl, [class*="citation"], a[href*="cites"]')
+SCHOLAR_LINK_SEL = CSSSelector("a[href]")
+YEAR_RE = re.compile(r"(\d{4})")
+JOURNAL_RES = (
+    re.compile(r"- ([^-]+)$"),
+    re.compile(r", ([^,]+)$"),
+    re.compile(r"in ([^,]+)"),
+)
+
+# --- Shared HTTP Clients ---
+# One long-lived client per header profile so connections are kept alive and
+# reused across tool calls. Scholar gets its own client so the browser headers
+# never leak into the public API requests.
+# Accept-Encoding is left to httpx, which advertises gzip, br and zstd whenever
+# the matching decoders (httpx[brotli,zstd]) are installed.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    headers={"User-Agent": USER_AGENT},
+    timeout=20.0,
+    limits=HTTP_LIMITS,
+)
+SCHOLAR_CLIENT = httpx.AsyncClient(
+    http2=True,
+    headers=SCHOLAR_HEADERS,
+    timeout=20.0,
+    limits=HTTP_LIMITS,
+)
+
+# --- Per-Host Concurrency Limits ---
+# Caps how many requests are in flight per host; excess calls queue here rather
+# than piling onto the upstream API. This bounds concurrency, not request rate.
+HOST_LIMITS = {
+    FDA_API_BASE: asyncio.Semaphore(10),
+    WHO_API_BASE: asyncio.Semaphore(10),
+    RXNAV_API_BASE: asyncio.Semaphore(10),
+    PUBMED_API_BASE: asyncio.Semaphore(10 if NCBI_API_KEY else 3),
+    GOOGLE_SCHOLAR_API_BASE: asyncio.Semaphore(2),
+}
+
+# NCBI E-utilities allow 3 req/s anonymously and 10 req/s with an API key, so
+# PubMed calls are additionally spaced out to that rate.
+PUBMED_MIN_INTERVAL = 1 / (10 if NCBI_API_KEY else 3)
+pubmed_next_slot = 0.0
+
+async def wait_for_pubmed_slot():
+    global pubmed_next_slot
+    now = time.monotonic()
+    slot = max(now, pubmed_next_slot)
+    pubmed_next_slot = slot + PUBMED_MIN_INTERVAL
+    if slot > now:
+        await asyncio.sleep(slot - now)
 
 # --- Auth Provider ---
+def load_public_key(key_path: Optional[str]) -> str:
+    # RSA keygen is the slowest part of startup, so when RSA_KEY_PATH is set the
+    # private key is written there once and reloaded on every later boot.
+    if key_path and os.path.exists(key_path):
+        with open(key_path, "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        return private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).decode()
+
+    k = RSAKeyPair.generate()
+    if key_path:
+        with os.fdopen(os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(k.private_key.get_secret_value())
+    return k.public_key
+
 class SimpleBearerAuthProvider(BearerAuthProvider):
     def __init__(self, token: str):
-        k = RSAKeyPair.generate()
-        super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
+        super().__init__(public_key=load_public_key(RSA_KEY_PATH), jwks_uri=None, issuer=None, audience=None)
         self.token = token
 
     async def load_access_token(self, token: str) -> AccessToken | None:
@@ -89,6 +182,7 @@ class PubMedArticle(BaseModel):
     authors: List[str]
     journal: str
     publication_date: str
+    doi: Optional[str] = None
 
 class GoogleScholarArticle(BaseModel):
     title: str
@@ -99,141 +193,285 @@ class GoogleScholarArticle(BaseModel):
     citations: str
     url: str
 
+# --- Response Cache ---
+# In-process TTL + LRU cache for the idempotent upstream lookups. Empty results
+# are not stored so rate-limited or failed calls are retried on the next request.
+CACHE_MAX_ENTRIES = 512
+DAY = 24 * 60 * 60
+RESPONSE_CACHE: "OrderedDict[tuple, tuple[float, Any]]" = OrderedDict()
+
+def cached(ttl: float):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            entry = RESPONSE_CACHE.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                RESPONSE_CACHE.move_to_end(key)
+                return entry[1]
+
+            value = await func(*args, **kwargs)
+            if value:
+                RESPONSE_CACHE[key] = (time.monotonic() + ttl, value)
+                RESPONSE_CACHE.move_to_end(key)
+                while len(RESPONSE_CACHE) > CACHE_MAX_ENTRIES:
+                    RESPONSE_CACHE.popitem(last=False)
+            return value
+        return wrapper
+    return decorator
+
 # --- Utility Functions ---
+def fda_phrase(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+OPENFDA_FIELDS = ("brand_name", "generic_name", "manufacturer_name", "route", "dosage_form")
+
+def label_fields(drug: Dict[str, Any]) -> Dict[str, Any]:
+    # FDA labels carry dozens of long free-text sections; keep only the
+    # fields the tools report so cached entries stay small.
+    fields = {field: drug.get(field) for field in DrugLabel.model_fields}
+    openfda = drug.get("openfda") or {}
+    fields["openfda"] = {key: openfda[key] for key in OPENFDA_FIELDS if key in openfda}
+    return fields
+
+@cached(ttl=7 * DAY)
 async def search_drugs(query: str, limit: int = 10) -> List[DrugLabel]:
-    async with httpx.AsyncClient() as client:
-        res = await client.get(
+    # A space between clauses is an OR in openFDA, so one call covers brand and generic names.
+    term = fda_phrase(query)
+    async with HOST_LIMITS[FDA_API_BASE]:
+        res = await CLIENT.get(
             f"{FDA_API_BASE}/drug/label.json",
-            params={"search": f"openfda.brand_name:{query}", "limit": limit},
-            headers={"User-Agent": USER_AGENT}
+            params={"search": f"openfda.brand_name:{term} openfda.generic_name:{term}", "limit": limit},
         )
-        return res.json().get("results", [])
+    return [label_fields(drug) for drug in orjson.loads(res.content).get("results", [])]
 
+@cached(ttl=7 * DAY)
 async def get_drug_by_ndc(ndc: str) -> Optional[DrugLabel]:
-    async with httpx.AsyncClient() as client:
-        res = await client.get(
+    async with HOST_LIMITS[FDA_API_BASE]:
+        res = await CLIENT.get(
             f"{FDA_API_BASE}/drug/label.json",
-            params={"search": f"openfda.product_ndc:{ndc}", "limit": 1},
-            headers={"User-Agent": USER_AGENT}
+            params={"search": f"openfda.product_ndc:{fda_phrase(ndc)}", "limit": 1},
         )
-        results = res.json().get("results", [])
-        return results[0] if results else None
+    results = orjson.loads(res.content).get("results", [])
+    return label_fields(results[0]) if results else None
 
-async def get_health_indicators(indicator_name: str, country: Optional[str] = None) -> List[WHOIndicator]:
+@cached(ttl=7 * DAY)
+async def get_health_indicators(indicator_name: str, country: Optional[str] = None, limit: int = 10) -> List[WHOIndicator]:
     filter_query = f"IndicatorName eq '{indicator_name}'"
     if country:
         filter_query += f" and SpatialDim eq '{country}'"
 
-    async with httpx.AsyncClient() as client:
-        res = await client.get(
-            f"{WHO_API_BASE}/Indicator",
-            params={"$filter": filter_query, "$format": "json"},
-            headers={"User-Agent": USER_AGENT}
-        )
-        return res.json().get("value", [])
-
+    # WHO payloads can run to megabytes; parse incrementally and stop reading
+    # the body as soon as enough rows have arrived.
+    indicators = []
+    events = ijson.sendable_list()
+    parser = ijson.items_coro(events, "value.item", use_float=True)
+    async with HOST_LIMITS[WHO_API_BASE], CLIENT.stream(
+        "GET",
+        f"{WHO_API_BASE}/Indicator",
+        params={"$filter": filter_query, "$format": "json"},
+    ) as res:
+        async for chunk in res.aiter_bytes():
+            parser.send(chunk)
+            indicators.extend(events)
+            del events[:]
+            if len(indicators) >= limit:
+                break
+    return indicators[:limit]
+
+@cached(ttl=7 * DAY)
 async def search_rxnorm_drugs(query: str) -> List[RxNormDrug]:
-    async with httpx.AsyncClient() as client:
-        res = await client.get(
+    async with HOST_LIMITS[RXNAV_API_BASE]:
+        res = await CLIENT.get(
             f"{RXNAV_API_BASE}/drugs.json",
             params={"name": query},
-            headers={"User-Agent": USER_AGENT}
         )
-        return res.json().get("drugGroup", {}).get("conceptGroup", [{}])[0].get("concept", [])
-
-async def random_delay(min_delay: float, max_delay: float):
-    delay = random.uniform(min_delay, max_delay)
-    await asyncio.sleep(delay)
-
-async def search_google_scholar(query: str) -> List[GoogleScholarArticle]:
-    await random_delay(1.0, 3.0)
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Cache-Control": "no-cache",
-        "Pragma": "no-cache"
-    }
+    groups = orjson.loads(res.content).get("drugGroup", {}).get("conceptGroup") or []
+    return [concept for group in groups for concept in group.get("concept", [])]
+
+# --- Google Scholar Backoff ---
+# Requests go out immediately; only after an error status or a page with no
+# result rows (usually a captcha) do we wait, doubling the window per consecutive failure.
+SCHOLAR_BACKOFF_MAX = 60.0
+scholar_backoff_until = 0.0
+scholar_failures = 0
+
+async def wait_for_scholar_backoff():
+    delay = scholar_backoff_until - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+def record_scholar_response(ok: bool):
+    global scholar_backoff_until, scholar_failures
+    if ok:
+        scholar_failures = 0
+        return
+    scholar_failures += 1
+    delay = min(SCHOLAR_BACKOFF_MAX, 2 ** scholar_failures) * random.uniform(0.5, 1.0)
+    scholar_backoff_until = time.monotonic() + delay
+
+def first_match(selector: CSSSelector, element: Any) -> Optional[Any]:
+    matches = selector(element)
+    return matches[0] if matches else None
+
+def element_href(element: Optional[Any]) -> str:
+    # The title group can match the <h3> before its <a>; fall back to the link inside it.
+    if element is not None and element.tag != "a":
+        element = first_match(SCHOLAR_LINK_SEL, element)
+    return element.get("href", "") if element is not None else ""
+
+def element_text(element: Optional[Any]) -> str:
+    if element is None:
+        return ""
+    return "".join(text.strip() for text in element.itertext())
+
+# lxml parsers must not be shared across threads, so each worker thread keeps
+# one HTMLParser per response charset.
+HTML_PARSERS = threading.local()
+
+def html_parser(charset: Optional[str]) -> Optional[Any]:
+    # lxml only sniffs <meta charset>; honour the Content-Type charset when sent.
+    # No charset, or one lxml doesn't know, falls back to lxml's default parser.
+    if not charset:
+        return None
+    parsers = HTML_PARSERS.__dict__.setdefault("by_charset", {})
+    charset = charset.lower()
+    if charset not in parsers:
+        try:
+            parsers[charset] = lxml_html.HTMLParser(encoding=charset)
+        except LookupError:
+            parsers[charset] = None
+    return parsers[charset]
+
+def parse_scholar_html(content: bytes, charset: Optional[str], max_results: int) -> Tuple[bool, List[GoogleScholarArticle]]:
+    parser = html_parser(charset)
+    tree = lxml_html.fromstring(content, parser=parser)
+    # The selector matches both the outer .gs_r[data-rp] and its nested .gs_ri;
+    # keep only top-level containers so each article is counted once.
+    matches = SCHOLAR_RESULT_SEL(tree)
+    matched = set(matches)
+    rows = [row for row in matches if not any(parent in matched for parent in row.iterancestors())]
+    results = []
+
+    for element in rows:
+        if len(results) >= max_results:
+            break
+
+        title_element = first_match(SCHOLAR_TITLE_SEL, element)
+        title = element_text(title_element)
+        url = element_href(title_element)
+
+        authors = element_text(first_match(SCHOLAR_AUTHORS_SEL, element))
+        abstract = element_text(first_match(SCHOLAR_ABSTRACT_SEL, element))
+        citations = element_text(first_match(SCHOLAR_CITATIONS_SEL, element))
+
+        year = next((m.group(1) for m in (YEAR_RE.search(text) for text in (authors, title, abstract)) if m), "")
+        journal = next((m.group(1).strip() for m in (pattern.search(authors) for pattern in JOURNAL_RES) if m), "")
+
+        if title and len(title) > 5:
+            results.append({
+                "title": title,
+                "authors": authors,
+                "abstract": abstract,
+                "journal": journal,
+                "year": year,
+                "citations": citations,
+                "url": url
+            })
 
-    async with httpx.AsyncClient(headers=headers) as client:
-        search_url = f"{GOOGLE_SCHOLAR_API_BASE}?q={query}&hl=en"
-        res = await client.get(search_url)
-        soup = BeautifulSoup(res.text, 'html.parser')
-        results = []
-
-        for element in soup.select(".gs_r, .gs_ri, [data-rp]"):
-            title_element = element.select_one(".gs_rt a, .gs_rt, h3 a, h3") or element.select_one("a[data-clk]") or element.select_one("h3")
-            title = title_element.get_text(strip=True) if title_element else ""
-            url = title_element.get('href') if title_element else ""
-
-            authors_element = element.select_one(".gs_a, .gs_authors, .gs_venue") or element.select_one('[class*="author"]') or element.select_one('[class*="venue"]')
-            authors = authors_element.get_text(strip=True) if authors_element else ""
-
-            abstract_element = element.select_one(".gs_rs, .gs_rs_a, .gs_snippet") or element.select_one('[class*="snippet"]') or element.select_one('[class*="abstract"]')
-            abstract = abstract_element.get_text(strip=True) if abstract_element else ""
-
-            citations_element = element.select_one(".gs_fl a, .gs_fl") or element.select_one('[class*="citation"]') or element.select_one('a[href*="cites"]')
-            citations = citations_element.get_text(strip=True) if citations_element else ""
-
-            year = ""
-            year_match = next((m.group(1) for m in [re.search(r"(\d{4})", text) for text in [authors, title, abstract]] if m), None)
-            if year_match:
-                year = year_match
-
-            journal = ""
-            journal_match = next((m.group(1) for m in [re.search(r"- ([^-]+)$", authors), re.search(r", ([^,]+)$", authors), re.search(r"in ([^,]+)", authors)] if m), None)
-            if journal_match:
-                journal = journal_match.strip()
-
-            if title and len(title) > 5:
-                results.append({
-                    "title": title,
-                    "authors": authors,
-                    "abstract": abstract,
-                    "journal": journal,
-                    "year": year,
-                    "citations": citations,
-                    "url": url
-                })
-
-        return results
+    return bool(rows), results
 
-async def search_pubmed_articles(query: str, max_results: int = 10) -> List[PubMedArticle]:
-    async with httpx.AsyncClient() as client:
-        search_res = await client.get(
-            f"{PUBMED_API_BASE}/esearch.fcgi",
-            params={"db": "pubmed", "term": query, "retmode": "json", "retmax": max_results},
-            headers={"User-Agent": USER_AGENT}
-        )
-        id_list = search_res.json().get("esearchresult", {}).get("idlist", [])
+@cached(ttl=DAY)
+async def search_google_scholar(query: str, max_results: int = 10) -> List[GoogleScholarArticle]:
+    await wait_for_scholar_backoff()
 
-        if not id_list:
-            return []
+    async with HOST_LIMITS[GOOGLE_SCHOLAR_API_BASE]:
+        res = await SCHOLAR_CLIENT.get(
+            GOOGLE_SCHOLAR_API_BASE,
+            params={"q": query, "hl": "en", "num": max_results},
+        )
+    if not res.is_success:
+        record_scholar_response(ok=False)
+        return []
 
-        fetch_res = await client.get(
-            f"{PUBMED_API_BASE}/efetch.fcgi",
-            params={"db": "pubmed", "id": ",".join(id_list), "retmode": "xml"},
-            headers={"User-Agent": USER_AGENT}
+    # Parsing a results page is tens of ms of CPU; keep it off the event loop.
+    # An empty or undecodable body counts as a failed scrape, like a 429.
+    try:
+        found_rows, results = await asyncio.to_thread(parse_scholar_html, res.content, res.charset_encoding, max_results)
+    except (etree.LxmlError, LookupError):
+        found_rows, results = False, []
+    record_scholar_response(ok=found_rows)
+    return results
+
+def node_text(node: Optional[Any]) -> str:
+    if node is None:
+        return ""
+    return "".join(node.itertext()).strip()
+
+def parse_pubmed_article(node: Any) -> PubMedArticle:
+    article = node.find("MedlineCitation/Article")
+
+    abstract = " ".join(filter(None, (node_text(part) for part in article.iterfind("Abstract/AbstractText"))))
+
+    authors = []
+    for author in article.iterfind("AuthorList/Author"):
+        name = " ".join(filter(None, (author.findtext("LastName"), author.findtext("Initials"))))
+        name = name or author.findtext("CollectiveName")
+        if name:
+            authors.append(name)
+
+    pub_date = article.find("Journal/JournalIssue/PubDate")
+    publication_date = ""
+    if pub_date is not None:
+        publication_date = pub_date.findtext("MedlineDate") or " ".join(
+            filter(None, (pub_date.findtext("Year"), pub_date.findtext("Month"), pub_date.findtext("Day")))
         )
 
-        articles = []
-        xml_text = fetch_res.text
-        pmid_matches = re.findall(r'<PMID[^>]*>(\d+)<\/PMID>', xml_text)
-        title_matches = re.findall(r'<ArticleTitle[^>]*>([^<]+)<\/ArticleTitle>', xml_text)
+    return {
+        "pmid": node.findtext("MedlineCitation/PMID", ""),
+        "title": node_text(article.find("ArticleTitle")),
+        "abstract": abstract or "Abstract not available",
+        "authors": authors,
+        "journal": article.findtext("Journal/Title") or "Journal information not available",
+        "publication_date": publication_date or "Date not available",
+        "doi": node.findtext('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]')
+    }
 
-        for pmid, title in zip(pmid_matches, title_matches):
-            articles.append({
-                "pmid": pmid,
-                "title": title,
-                "abstract": "Abstract not available in this format",
-                "authors": [],
-                "journal": "Journal information not available",
-                "publication_date": "Date not available"
-            })
+def parse_pubmed_xml(content: bytes) -> List[PubMedArticle]:
+    root = etree.fromstring(content)
+    return [parse_pubmed_article(node) for node in root.iterfind(".//PubmedArticle")]
+
+async def pubmed_get(endpoint: str, params: Dict[str, Any]) -> httpx.Response:
+    if NCBI_API_KEY:
+        params = {**params, "api_key": NCBI_API_KEY}
+    async with HOST_LIMITS[PUBMED_API_BASE]:
+        await wait_for_pubmed_slot()
+        return await CLIENT.get(f"{PUBMED_API_BASE}/{endpoint}", params=params)
+
+@cached(ttl=DAY)
+async def search_pubmed_articles(query: str, max_results: int = 10) -> List[PubMedArticle]:
+    search_res = await pubmed_get(
+        "esearch.fcgi",
+        {"db": "pubmed", "term": query, "retmode": "json", "retmax": max_results},
+    )
+    id_list = orjson.loads(search_res.content).get("esearchresult", {}).get("idlist", [])
+
+    if not id_list:
+        return []
 
-        return articles
+    fetch_res = await pubmed_get(
+        "efetch.fcgi",
+        {"db": "pubmed", "id": ",".join(id_list), "retmode": "xml"},
+    )
+    return await asyncio.to_thread(parse_pubmed_xml, fetch_res.content)
+
+def first_value(fields: Dict[str, List[str]], key: str, default: str = "Not specified") -> str:
+    values = fields.get(key)
+    return values[0] if values else default
+
+def json_response(**payload: Any) -> str:
+    return orjson.dumps(payload).decode()
 
 # --- MCP Tools ---
 @mcp.tool
@@ -250,30 +488,35 @@ SearchDrugsDescription = RichToolDescription(
 @mcp.tool(description=SearchDrugsDescription.model_dump_json())
 async def search_drugs_tool(
     query: str = Field(..., description="Drug name to search for (brand name or generic name)"),
-    limit: int = Field(10, description="Number of results to return (max 50)", ge=1, le=50)
+    limit: int = Field(10, description="Number of results to return (max 50)", ge=1, le=50),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
         drugs = await search_drugs(query, limit)
 
+        if format == "json":
+            return json_response(query=query, count=len(drugs), items=drugs)
+
         if not drugs:
             return f"No drugs found matching '{query}'. Try a different search term."
 
-        result = f"**Drug Search Results for '{query}'**\n\n"
-        result += f"Found {len(drugs)} drug(s)\n\n"
+        parts = [f"**Drug Search Results for '{query}'**\n\n"]
+        parts.append(f"Found {len(drugs)} drug(s)\n\n")
 
         for index, drug in enumerate(drugs, start=1):
-            result += f"{index}. **{drug['openfda'].get('brand_name', ['Unknown Brand'])[0]}**\n"
-            result += f"   Generic Name: {drug['openfda'].get('generic_name', ['Not specified'])[0]}\n"
-            result += f"   Manufacturer: {drug['openfda'].get('manufacturer_name', ['Not specified'])[0]}\n"
-            result += f"   Route: {drug['openfda'].get('route', ['Not specified'])[0]}\n"
-            result += f"   Dosage Form: {drug['openfda'].get('dosage_form', ['Not specified'])[0]}\n"
+            openfda = drug.get('openfda', {})
+            parts.append(f"{index}. **{first_value(openfda, 'brand_name', 'Unknown Brand')}**\n")
+            parts.append(f"   Generic Name: {first_value(openfda, 'generic_name')}\n")
+            parts.append(f"   Manufacturer: {first_value(openfda, 'manufacturer_name')}\n")
+            parts.append(f"   Route: {first_value(openfda, 'route')}\n")
+            parts.append(f"   Dosage Form: {first_value(openfda, 'dosage_form')}\n")
 
             if drug.get('purpose') and drug['purpose']:
-                result += f"   Purpose: {drug['purpose'][0][:200]}{'...' if len(drug['purpose'][0]) > 200 else ''}\n"
+                parts.append(f"   Purpose: {drug['purpose'][0][:200]}{'...' if len(drug['purpose'][0]) > 200 else ''}\n")
 
-            result += f"   Last Updated: {drug['effective_time']}\n\n"
+            parts.append(f"   Last Updated: {drug['effective_time']}\n\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error searching drugs: {str(e)}"
 
@@ -286,42 +529,47 @@ GetDrugDetailsDescription = RichToolDescription(
 
 @mcp.tool(description=GetDrugDetailsDescription.model_dump_json())
 async def get_drug_details_tool(
-    ndc: str = Field(..., description="National Drug Code (NDC) of the drug")
+    ndc: str = Field(..., description="National Drug Code (NDC) of the drug"),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
         drug = await get_drug_by_ndc(ndc)
 
+        if format == "json":
+            return json_response(ndc=ndc, item=drug)
+
         if not drug:
             return f"No drug found with NDC: {ndc}"
 
-        result = f"**Drug Details for NDC: {ndc}**\n\n"
-        result += "**Basic Information:**\n"
-        result += f"- Brand Name: {drug['openfda'].get('brand_name', ['Not specified'])[0]}\n"
-        result += f"- Generic Name: {drug['openfda'].get('generic_name', ['Not specified'])[0]}\n"
-        result += f"- Manufacturer: {drug['openfda'].get('manufacturer_name', ['Not specified'])[0]}\n"
-        result += f"- Route: {drug['openfda'].get('route', ['Not specified'])[0]}\n"
-        result += f"- Dosage Form: {drug['openfda'].get('dosage_form', ['Not specified'])[0]}\n"
-        result += f"- Last Updated: {drug['effective_time']}\n\n"
+        parts = [f"**Drug Details for NDC: {ndc}**\n\n"]
+        parts.append("**Basic Information:**\n")
+        openfda = drug.get('openfda', {})
+        parts.append(f"- Brand Name: {first_value(openfda, 'brand_name')}\n")
+        parts.append(f"- Generic Name: {first_value(openfda, 'generic_name')}\n")
+        parts.append(f"- Manufacturer: {first_value(openfda, 'manufacturer_name')}\n")
+        parts.append(f"- Route: {first_value(openfda, 'route')}\n")
+        parts.append(f"- Dosage Form: {first_value(openfda, 'dosage_form')}\n")
+        parts.append(f"- Last Updated: {drug['effective_time']}\n\n")
 
         if drug.get('purpose') and drug['purpose']:
-            result += "**Purpose/Uses:**\n"
+            parts.append("**Purpose/Uses:**\n")
             for index, purpose in enumerate(drug['purpose'], start=1):
-                result += f"{index}. {purpose}\n"
-            result += "\n"
+                parts.append(f"{index}. {purpose}\n")
+            parts.append("\n")
 
         if drug.get('warnings') and drug['warnings']:
-            result += "**Warnings:**\n"
+            parts.append("**Warnings:**\n")
             for index, warning in enumerate(drug['warnings'], start=1):
-                result += f"{index}. {warning[:300]}{'...' if len(warning) > 300 else ''}\n"
-            result += "\n"
+                parts.append(f"{index}. {warning[:300]}{'...' if len(warning) > 300 else ''}\n")
+            parts.append("\n")
 
         if drug.get('drug_interactions') and drug['drug_interactions']:
-            result += "**Drug Interactions:**\n"
+            parts.append("**Drug Interactions:**\n")
             for index, interaction in enumerate(drug['drug_interactions'], start=1):
-                result += f"{index}. {interaction[:300]}{'...' if len(interaction) > 300 else ''}\n"
-            result += "\n"
+                parts.append(f"{index}. {interaction[:300]}{'...' if len(interaction) > 300 else ''}\n")
+            parts.append("\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error fetching drug details: {str(e)}"
 
@@ -336,28 +584,32 @@ GetHealthStatisticsDescription = RichToolDescription(
 async def get_health_statistics_tool(
     indicator: str = Field(..., description="Health indicator to search for (e.g., 'Life expectancy', 'Mortality rate')"),
     country: Optional[str] = Field(None, description="Country code (e.g., 'USA', 'GBR') - optional"),
-    limit: int = Field(10, description="Number of results to return (max 20)", ge=1, le=20)
+    limit: int = Field(10, description="Number of results to return (max 20)", ge=1, le=20),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
-        indicators = await get_health_indicators(indicator, country)
+        indicators = await get_health_indicators(indicator, country, limit)
+
+        if format == "json":
+            return json_response(indicator=indicator, country=country, count=len(indicators), items=indicators)
 
         if not indicators:
             return f"No health indicators found for '{indicator}'{' in ' + country if country else ''}. Try a different search term."
 
-        result = f"**Health Statistics: {indicator}**\n\n"
+        parts = [f"**Health Statistics: {indicator}**\n\n"]
         if country:
-            result += f"Country: {country}\n"
-        result += f"Found {len(indicators)} data points\n\n"
+            parts.append(f"Country: {country}\n")
+        parts.append(f"Found {len(indicators)} data points\n\n")
 
-        for index, ind in enumerate(indicators[:limit], start=1):
-            result += f"{index}. **{ind['SpatialDim']}** ({ind['TimeDim']})\n"
-            result += f"   Value: {ind['Value']} {ind['Comments'] or ''}\n"
-            result += f"   Numeric Value: {ind['NumericValue']}\n"
+        for index, ind in enumerate(indicators, start=1):
+            parts.append(f"{index}. **{ind['SpatialDim']}** ({ind['TimeDim']})\n")
+            parts.append(f"   Value: {ind['Value']} {ind['Comments'] or ''}\n")
+            parts.append(f"   Numeric Value: {ind['NumericValue']}\n")
             if ind.get('Low') and ind.get('High'):
-                result += f"   Range: {ind['Low']} - {ind['High']}\n"
-            result += f"   Date: {ind['Date']}\n\n"
+                parts.append(f"   Range: {ind['Low']} - {ind['High']}\n")
+            parts.append(f"   Date: {ind['Date']}\n\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error fetching health statistics: {str(e)}"
 
@@ -371,27 +623,31 @@ SearchMedicalLiteratureDescription = RichToolDescription(
 @mcp.tool(description=SearchMedicalLiteratureDescription.model_dump_json())
 async def search_medical_literature_tool(
     query: str = Field(..., description="Medical topic or condition to search for"),
-    max_results: int = Field(10, description="Maximum number of articles to return (max 20)", ge=1, le=20)
+    max_results: int = Field(10, description="Maximum number of articles to return (max 20)", ge=1, le=20),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
         articles = await search_pubmed_articles(query, max_results)
 
+        if format == "json":
+            return json_response(query=query, count=len(articles), items=articles)
+
         if not articles:
             return f"No medical articles found for '{query}'. Try a different search term."
 
-        result = f"**Medical Literature Search: '{query}'**\n\n"
-        result += f"Found {len(articles)} article(s)\n\n"
+        parts = [f"**Medical Literature Search: '{query}'**\n\n"]
+        parts.append(f"Found {len(articles)} article(s)\n\n")
 
         for index, article in enumerate(articles, start=1):
-            result += f"{index}. **{article['title']}**\n"
-            result += f"   PMID: {article['pmid']}\n"
-            result += f"   Journal: {article['journal']}\n"
-            result += f"   Publication Date: {article['publication_date']}\n"
+            parts.append(f"{index}. **{article['title']}**\n")
+            parts.append(f"   PMID: {article['pmid']}\n")
+            parts.append(f"   Journal: {article['journal']}\n")
+            parts.append(f"   Publication Date: {article['publication_date']}\n")
             if article.get('doi'):
-                result += f"   DOI: {article['doi']}\n"
-            result += "\n"
+                parts.append(f"   DOI: {article['doi']}\n")
+            parts.append("\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error searching medical literature: {str(e)}"
 
@@ -404,27 +660,31 @@ SearchDrugNomenclatureDescription = RichToolDescription(
 
 @mcp.tool(description=SearchDrugNomenclatureDescription.model_dump_json())
 async def search_drug_nomenclature_tool(
-    query: str = Field(..., description="Drug name to search for in RxNorm database")
+    query: str = Field(..., description="Drug name to search for in RxNorm database"),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
         drugs = await search_rxnorm_drugs(query)
 
+        if format == "json":
+            return json_response(query=query, count=len(drugs), items=drugs)
+
         if not drugs:
             return f"No drugs found in RxNorm database for '{query}'. Try a different search term."
 
-        result = f"**RxNorm Drug Search: '{query}'**\n\n"
-        result += f"Found {len(drugs)} drug(s)\n\n"
+        parts = [f"**RxNorm Drug Search: '{query}'**\n\n"]
+        parts.append(f"Found {len(drugs)} drug(s)\n\n")
 
         for index, drug in enumerate(drugs, start=1):
-            result += f"{index}. **{drug['name']}**\n"
-            result += f"   RxCUI: {drug['rxcui']}\n"
-            result += f"   Term Type: {drug['tty']}\n"
-            result += f"   Language: {drug['language']}\n"
+            parts.append(f"{index}. **{drug['name']}**\n")
+            parts.append(f"   RxCUI: {drug['rxcui']}\n")
+            parts.append(f"   Term Type: {drug['tty']}\n")
+            parts.append(f"   Language: {drug['language']}\n")
             if drug.get('synonym') and drug['synonym']:
-                result += f"   Synonyms: {', '.join(drug['synonym'][:3])}{'...' if len(drug['synonym']) > 3 else ''}\n"
-            result += "\n"
+                parts.append(f"   Synonyms: {', '.join(drug['synonym'][:3])}{'...' if len(drug['synonym']) > 3 else ''}\n")
+            parts.append("\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error searching RxNorm: {str(e)}"
 
@@ -437,42 +697,50 @@ SearchGoogleScholarDescription = RichToolDescription(
 
 @mcp.tool(description=SearchGoogleScholarDescription.model_dump_json())
 async def search_google_scholar_tool(
-    query: str = Field(..., description="Academic topic or research query to search for")
+    query: str = Field(..., description="Academic topic or research query to search for"),
+    max_results: int = Field(10, description="Maximum number of articles to return (max 20)", ge=1, le=20),
+    format: Literal["json", "markdown"] = Field("json", description="Response format: compact JSON (default) or human-readable markdown")
 ) -> str:
     try:
-        articles = await search_google_scholar(query)
+        articles = await search_google_scholar(query, max_results)
+
+        if format == "json":
+            return json_response(query=query, count=len(articles), items=articles)
 
         if not articles:
             return f"No academic articles found for '{query}'. This could be due to:\n- No results matching your query\n- Google Scholar rate limiting\n- Network connectivity issues\n\nTry refining your search terms or try again later."
 
-        result = f"**Google Scholar Search: '{query}'**\n\n"
-        result += f"Found {len(articles)} article(s)\n\n"
+        parts = [f"**Google Scholar Search: '{query}'**\n\n"]
+        parts.append(f"Found {len(articles)} article(s)\n\n")
 
         for index, article in enumerate(articles, start=1):
-            result += f"{index}. **{article['title']}**\n"
+            parts.append(f"{index}. **{article['title']}**\n")
             if article.get('authors'):
-                result += f"   Authors: {article['authors']}\n"
+                parts.append(f"   Authors: {article['authors']}\n")
             if article.get('journal'):
-                result += f"   Journal: {article['journal']}\n"
+                parts.append(f"   Journal: {article['journal']}\n")
             if article.get('year'):
-                result += f"   Year: {article['year']}\n"
+                parts.append(f"   Year: {article['year']}\n")
             if article.get('citations'):
-                result += f"   Citations: {article['citations']}\n"
+                parts.append(f"   Citations: {article['citations']}\n")
             if article.get('url'):
-                result += f"   URL: {article['url']}\n"
+                parts.append(f"   URL: {article['url']}\n")
             if article.get('abstract'):
-                result += f"   Abstract: {article['abstract'][:300]}{'...' if len(article['abstract']) > 300 else ''}\n"
-            result += "\n"
+                parts.append(f"   Abstract: {article['abstract'][:300]}{'...' if len(article['abstract']) > 300 else ''}\n")
+            parts.append("\n")
 
-        return result
+        return "".join(parts)
     except Exception as e:
         return f"Error searching Google Scholar: {str(e)}. This might be due to rate limiting or network issues. Please try again later."
 
 # --- Run MCP Server ---
 async def main():
     print("🚀 Starting Medical MCP server on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    try:
+        await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    finally:
+        await CLIENT.aclose()
+        await SCHOLAR_CLIENT.aclose()
 
 if __name__ == "__main__":
-    import re
     asyncio.run(main())